@@ -2,11 +2,40 @@
 import argparse
 import json
 import csv
+import http.client
 import time
 import sys
+import threading
+import urllib.parse
 import urllib.request
 import urllib.error
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import SimpleQueue
+
+# Max probes in flight against one host, whatever --concurrency is
+PER_HOST_LIMIT = 4
+
+# Discord alerts are sent from their own small pool
+ALERT_WORKERS = 4
+
+# Redirects are followed like urlopen() does, with the same schemes and limits
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+_REDIRECT_SCHEMES = ("http", "https", "ftp", "")
+_REDIRECTS = urllib.request.HTTPRedirectHandler
+# Response bodies up to this size are drained so the connection can be reused;
+# larger ones close it, so probes never download bodies the baseline skipped
+_MAX_DRAIN = 4 << 10
+# Same User-Agent as urlopen(), so probes look alike on every path
+_PROBE_HEADERS = {"User-Agent": "Python-urllib/" + urllib.request.__version__}
+
+# Static parts of Discord alert requests, built once per process
+_DISCORD_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "DevOpsLab2-ApiMonitor/1.0"
+}
+_DISCORD_OPENER = urllib.request.build_opener()
+_PROXIES = urllib.request.getproxies()
 
 def parse_args():
     p = argparse.ArgumentParser(
@@ -34,30 +63,164 @@ def parse_args():
         default="api_report.csv",
         help="Output CSV file"
     )
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=32,
+        help="Max number of URLs checked in parallel"
+    )
     p.add_argument(
         "--discord-webhook",
         default="",
         help="Discord webhook URL for alerts"
     )
 
-    return p.parse_args()
+    args = p.parse_args()
+    if args.concurrency < 1:
+        p.error("--concurrency must be at least 1")
+    return args
+
+# (unix second, "YYYY-MM-DDTHH:MM:SS") of the last formatted timestamp
+_stamp_cache = (None, "")
+
+def utc_isoformat(ns):
+    """Format a time.time_ns() value like datetime.utcnow().isoformat().
+
+    Probes finishing within the same second share the cached date/time prefix,
+    so only the microseconds are formatted per call.
+    """
+    global _stamp_cache
+    secs, micros = divmod(ns // 1000, 1_000_000)
+    cached_secs, stamp = _stamp_cache
+    if secs != cached_secs:
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(secs))
+        _stamp_cache = (secs, stamp)
+    return f"{stamp}.{micros:06d}" if micros else stamp
+
+def pool_key(parts):
+    # explicit port: "::1" alone would be misread as host ":" port 1,
+    # and "host" and "host:443" share one entry
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return parts.scheme, parts.hostname, port
+
+def host_key(url):
+    # same key as the connection pool, so "h", "H:80" and "u@h" share slots;
+    # malformed URLs get their own slot and fail in check_url() like any other
+    try:
+        return pool_key(urllib.parse.urlsplit(url))
+    except ValueError:
+        return url
+
+def can_pool(url):
+    # plain http(s) with a host only; proxied or host-less URLs keep going
+    # through urllib, which reports them the usual way
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    return parts.scheme not in _PROXIES or urllib.request.proxy_bypass(parts.hostname or "")
+
+def get_pooled(url, timeout, connections):
+    """Send one GET over an idle keep-alive connection to the URL's host.
+
+    connections maps (scheme, host, port) to a list of idle connections; a
+    thread pops one (or opens a new one) and puts it back once the response
+    is fully read. Returns (status, reason, location, headers_ns), where
+    headers_ns is the time_ns() at which the response headers arrived.
+    """
+    parts = urllib.parse.urlsplit(url)
+    key = pool_key(parts)
+    port = key[2]
+    idle = connections.setdefault(key, [])
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
 
-def check_url(url, timeout):
-    start = time.time()
+    while True:
+        try:
+            conn = idle.pop()
+            reused = True
+        except IndexError:
+            if parts.scheme == "https":
+                conn = http.client.HTTPSConnection(parts.hostname, port, timeout=timeout)
+            else:
+                conn = http.client.HTTPConnection(parts.hostname, port, timeout=timeout)
+            reused = False
+
+        try:
+            conn.request("GET", path, headers=_PROBE_HEADERS)
+            resp = conn.getresponse()
+            headers_ns = time.time_ns()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if reused:
+                # the server dropped the idle connection, retry on a new one
+                continue
+            raise
+        except Exception:
+            conn.close()
+            raise
+        break
+
+    location = resp.getheader("Location")
+    if resp.will_close or resp.length is None or resp.length > _MAX_DRAIN:
+        conn.close()
+    else:
+        try:
+            resp.read()
+            idle.append(conn)
+        except Exception:
+            conn.close()
+
+    return resp.status, resp.reason, location, headers_ns
+
+def fetch_status(url, timeout, connections):
+    """Return (status, reason, headers_ns) of a GET, following redirects like
+    urlopen(); headers_ns is when the final response's headers arrived."""
+    # visit counts per redirect target, as urllib keeps them
+    visited = {}
+    while True:
+        status, reason, location, headers_ns = get_pooled(url, timeout, connections)
+        if status not in _REDIRECT_CODES or not location:
+            return status, reason, headers_ns
+        if urllib.parse.urlsplit(location).scheme not in _REDIRECT_SCHEMES:
+            # never let the server pick e.g. a file: or data: URL to open
+            return status, f"{reason} - Redirection to url '{location}' is not allowed", headers_ns
+        url = urllib.parse.urljoin(url, location)
+        if (visited.get(url, 0) >= _REDIRECTS.max_repeats
+                or len(visited) >= _REDIRECTS.max_redirections):
+            return status, _REDIRECTS.inf_msg + reason, headers_ns
+        visited[url] = visited.get(url, 0) + 1
+        if not can_pool(url):
+            # e.g. redirected to a proxied host: urllib follows it from here
+            req = urllib.request.Request(url, method="GET")
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return resp.status, resp.reason, time.time_ns()
+
+def check_url(url, timeout, connections=None):
+    started_ns = time.time_ns()
     status = None
     error = ""
+    # response time stops when the headers arrive, not after the body is read
+    headers_ns = None
 
     try:
-        req = urllib.request.Request(url, method="GET")
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            status = resp.status
+        if connections is not None and can_pool(url):
+            status, reason, headers_ns = fetch_status(url, timeout, connections)
+            # urlopen() reports every non-2xx final status as an HTTPError
+            if not 200 <= status < 300:
+                error = f"HTTP Error {status}: {reason}"
+        else:
+            req = urllib.request.Request(url, method="GET")
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                status = resp.status
     except urllib.error.HTTPError as e:
         status = e.code
         error = str(e)
     except Exception as e:
         error = str(e)
 
-    duration = round((time.time() - start) * 1000, 2)
+    finished_ns = time.time_ns()
+    duration = round(((headers_ns or finished_ns) - started_ns) / 1_000_000, 2)
 
     # ok is True only for 2xx and 3xx responses
     ok = status is not None and 200 <= status < 400
@@ -68,33 +231,34 @@ def check_url(url, timeout):
         "status": status,
         "response_time_ms": duration,
         "error": error,
-        "checked_at": datetime.utcnow().isoformat()
+        "checked_at": utc_isoformat(finished_ns)
     }
 
-def send_discord_alert(message, webhook_url):
+def validate_webhook_url(webhook_url):
     if not webhook_url:
         print("DISCORD: webhook url is empty", file=sys.stderr)
-        return
+        return False
 
     if not (webhook_url.startswith("http://") or webhook_url.startswith("https://")):
         print("DISCORD: invalid webhook url format", file=sys.stderr)
-        return
+        return False
 
+    return True
+
+def send_discord_alert(message, webhook_url):
+    # webhook_url is expected to be checked by validate_webhook_url() already
     payload = {"content": message}
     data = json.dumps(payload).encode("utf-8")
 
     req = urllib.request.Request(
         webhook_url,
         data=data,
-        headers={
-            "Content-Type": "application/json",
-            "User-Agent": "DevOpsLab2-ApiMonitor/1.0"
-        },
+        headers=_DISCORD_HEADERS,
         method="POST"
     )
 
     try:
-        with urllib.request.urlopen(req, timeout=10) as resp:
+        with _DISCORD_OPENER.open(req, timeout=10) as resp:
             print(f"DISCORD: sent, status={resp.status}")
     except urllib.error.HTTPError as e:
         body = e.read().decode("utf-8", errors="replace") if hasattr(e, "read") else ""
@@ -106,27 +270,47 @@ def main():
     args = parse_args()
 
     webhook_url = args.discord_webhook
-    results = []
+    # checked on the first failing result, so all-green runs stay quiet
+    alerts_enabled = None
 
-    for url in args.urls:
-        result = check_url(url, args.timeout)
-        results.append(result)
+    # Probe all URLs concurrently: total time is bounded by the slowest
+    # endpoint instead of the sum of all round-trips. Results keep input order
+    # and are written to both reports as they arrive instead of being buffered.
+    workers = min(args.concurrency, len(args.urls))
+    # idle keep-alive connections per (scheme, host, port), shared by all probes
+    connections = {}
+    # URLs waiting for one of their host's PER_HOST_LIMIT slots; a slot is
+    # taken before a probe is submitted, so no worker blocks on a busy host
+    queued = {}
+    for i, url in enumerate(args.urls):
+        queued.setdefault(host_key(url), deque()).append(i)
+    # main and finishing probes both hand out slots from the same deques
+    queued_lock = threading.Lock()
 
-        if not result["ok"]:
-            msg = (
-                f"API ALERT\n"
-                f"URL: {result['url']}\n"
-                f"Status: {result['status']}\n"
-                f"Error: {result['error']}"
-            )
-            send_discord_alert(msg, webhook_url)
+    def next_queued(host):
+        with queued_lock:
+            pending = queued[host]
+            return pending.popleft() if pending else None
+    # (index, result, exception) of each finished probe, in completion order
+    finished = SimpleQueue()
 
-    with open(args.json_out, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2)
-
-    with open(args.csv_out, "w", newline="", encoding="utf-8") as f:
+    def probe(host, i):
+        try:
+            finished.put((i, check_url(args.urls[i], args.timeout, connections), None))
+        except BaseException as e:
+            # re-raised in main instead of leaving it waiting
+            finished.put((i, None, e))
+        finally:
+            # hand this host's slot to its next queued URL
+            i = next_queued(host)
+            if i is not None:
+                pool.submit(probe, host, i)
+    with open(args.json_out, "w", encoding="utf-8") as json_f, \
+            open(args.csv_out, "w", newline="", encoding="utf-8") as csv_f, \
+            ThreadPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=ALERT_WORKERS) as alert_pool:
         writer = csv.DictWriter(
-            f,
+            csv_f,
             fieldnames=[
                 "url",
                 "ok",
@@ -137,8 +321,51 @@ def main():
             ]
         )
         writer.writeheader()
-        for r in results:
-            writer.writerow(r)
+
+        # same layout as json.dump(results, f, indent=2), one element at a time
+        json_f.write("[")
+        sep = "\n"
+
+        for host in queued:
+            for _ in range(PER_HOST_LIMIT):
+                # early probes may already have drained this host's queue
+                i = next_queued(host)
+                if i is None:
+                    break
+                pool.submit(probe, host, i)
+
+        # results that finished ahead of an earlier URL, until its turn comes
+        early = {}
+        for i in range(len(args.urls)):
+            while i not in early:
+                j, result, exc = finished.get()
+                early[j] = (result, exc)
+            # written below; popped so finished results aren't kept until the end
+            result, exc = early.pop(i)
+            if exc is not None:
+                raise exc
+            json_f.write(sep + "  " + json.dumps(result, indent=2).replace("\n", "\n  "))
+            sep = ",\n"
+            writer.writerow(result)
+
+            if not result["ok"] and alerts_enabled is None:
+                alerts_enabled = validate_webhook_url(webhook_url)
+
+            if not result["ok"] and alerts_enabled:
+                msg = (
+                    f"API ALERT\n"
+                    f"URL: {result['url']}\n"
+                    f"Status: {result['status']}\n"
+                    f"Error: {result['error']}"
+                )
+                # separate pool: alerts must not queue behind pending probes
+                alert_pool.submit(send_discord_alert, msg, webhook_url)
+
+        json_f.write("]" if sep == "\n" else "\n]")
+
+    for idle in connections.values():
+        for conn in idle:
+            conn.close()
 
     print(f"OK: JSON report saved to {args.json_out}")
     print(f"OK: CSV report saved to {args.csv_out}")
@@ -2,19 +2,75 @@
 import argparse
 import collections
 import html
+import mmap
+import multiprocessing
 import os
 import re
+import string
 import sys
 from datetime import datetime
+from heapq import nlargest
+from operator import itemgetter
+
+try:
+    # optional C build of parse_log_line_fast(), see log_parser_ext.pyx
+    from log_parser_ext import parse_line as _parse_line_ext
+except ImportError:
+    _parse_line_ext = None
+
+try:
+    # optional google-re2 engine (pip install google-re2)
+    import re2
+except ImportError:
+    re2 = None
 
 # Supports typical Nginx/Apache combined-like format:
 # 127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /path HTTP/1.1" 200 123 "-" "User-Agent"
-LOG_PATTERN = re.compile(
-    r'^(?P<ip>\S+)\s+\S+\s+\S+\s+\[(?P<time>[^\]]+)\]\s+'
-    r'"(?P<method>\S+)\s+(?P<path>\S+)\s+(?P<proto>[^"]+)"\s+'
-    r'(?P<status>\d{3})\s+(?P<size>\S+)\s+'
-    r'"(?P<referer>[^"]*)"\s+"(?P<ua>[^"]*)"\s*$'
+# Lines are matched as raw bytes; only the fields shown in the report get decoded.
+# Possessive quantifiers stop the engine from backtracking into a field once
+# it is consumed, so malformed lines fail fast. The separator before proto
+# stays greedy: proto may itself start with whitespace. Before Python 3.11 re
+# has no possessive quantifiers; the plain greedy form matches the same lines
+# with the same groups, only slower on malformed ones.
+# No class matches b"\n" ([^\S\n] is \s without it) and the pattern is
+# MULTILINE, so it works both on single lines and via finditer() over a whole
+# buffer, where every match is exactly one line.
+_LOG_REGEX = (
+    rb'^(?P<ip>\S++)[^\S\n]++\S++[^\S\n]++\S++[^\S\n]++\[(?P<time>[^\]\n]++)\][^\S\n]++'
+    rb'"(?P<method>\S++)[^\S\n]++(?P<path>\S++)[^\S\n]+(?P<proto>[^"\n]++)"[^\S\n]++'
+    rb'(?P<status>\d{3})[^\S\n]++(?P<size>\S++)[^\S\n]++'
+    rb'"(?P<referer>[^"\n]*+)"[^\S\n]++"(?P<ua>[^"\n]*+)"[^\S\n]*+$'
 )
+if sys.version_info < (3, 11):
+    _LOG_REGEX = _LOG_REGEX.replace(b"++", b"+").replace(b"*+", b"*")
+LOG_PATTERN = re.compile(_LOG_REGEX, re.MULTILINE)
+_MATCH = LOG_PATTERN.match
+# set by use_regex_engine(): whole-buffer scanning, see tally_buffer()
+_FINDITER = LOG_PATTERN.finditer if _parse_line_ext is None else None
+
+if re2 is not None:
+    # Same grammar for RE2, which guarantees linear-time matching. It has no
+    # possessive quantifiers, and its \s lacks \v, so the whitespace classes
+    # are spelled out to keep the accepted lines identical. Latin-1 mode makes
+    # RE2 treat every byte as one character, like re does.
+    _re2_options = re2.Options()
+    _re2_options.encoding = re2.Options.Encoding.LATIN1
+    LOG_PATTERN_RE2 = re2.compile(
+        rb'^(?P<ip>[^ \t\n\v\f\r]+)[ \t\n\v\f\r]+[^ \t\n\v\f\r]+[ \t\n\v\f\r]+[^ \t\n\v\f\r]+[ \t\n\v\f\r]+'
+        rb'\[(?P<time>[^\]]+)\][ \t\n\v\f\r]+'
+        rb'"(?P<method>[^ \t\n\v\f\r]+)[ \t\n\v\f\r]+(?P<path>[^ \t\n\v\f\r]+)[ \t\n\v\f\r]+(?P<proto>[^"]+)"[ \t\n\v\f\r]+'
+        rb'(?P<status>[0-9]{3})[ \t\n\v\f\r]+(?P<size>[^ \t\n\v\f\r]+)[ \t\n\v\f\r]+'
+        rb'"(?P<referer>[^"]*)"[ \t\n\v\f\r]+"(?P<ua>[^"]*)"[ \t\n\v\f\r]*$',
+        _re2_options,
+    )
+else:
+    LOG_PATTERN_RE2 = None
+
+def use_regex_engine(name: str) -> None:
+    """Select the regex engine; whole-buffer scanning needs stdlib re and no C tokenizer."""
+    global _MATCH, _FINDITER
+    _MATCH = (LOG_PATTERN_RE2 if name == "re2" else LOG_PATTERN).match
+    _FINDITER = LOG_PATTERN.finditer if name == "re" and _parse_line_ext is None else None
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(
@@ -24,76 +80,213 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("-o", "--output", default="report.html", help="Path to output HTML report")
     p.add_argument("--top", type=int, default=10, help="Top N entries for IPs and User-Agents")
     p.add_argument("--max-lines", type=int, default=0, help="Max lines to process (0 = all)")
+    p.add_argument(
+        "--live", action="store_true",
+        help="Input may still be written or truncated (e.g. logrotate copytruncate): read it without mmap"
+    )
+    p.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="Parse the file in N parallel processes (ignored with --max-lines)"
+    )
+    p.add_argument(
+        "--regex-engine", choices=("re", "re2"), default="re",
+        help="Engine for lines the tokenizer cannot split; re2 (google-re2) is linear-time but slower"
+    )
     return p.parse_args()
 
-def safe_int(x: str, default: int = 0) -> int:
+def safe_int(x, default: int = 0) -> int:
     try:
         return int(x)
     except Exception:
         return default
 
-def read_lines(path: str, max_lines: int = 0):
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
+def read_lines_stream(path: str, max_lines: int = 0, start: int = 0, end: int = None):
+    """read()-based read_lines(): a file truncated while it is read just hits EOF."""
+    with open(path, "rb", buffering=1 << 20) as f:
+        f.seek(start)
+        pos = start
         for idx, line in enumerate(f, start=1):
-            if max_lines and idx > max_lines:
+            if (end is not None and pos >= end) or (max_lines and idx > max_lines):
                 break
-            yield line.rstrip("\n")
+            pos += len(line)
+            yield line.rstrip(b"\n")
 
-def parse_log_line(line: str):
-    m = LOG_PATTERN.match(line)
-    if not m:
+def read_lines(path: str, max_lines: int = 0, start: int = 0, end: int = None, use_mmap: bool = True):
+    """Yield lines without b"\\n"; start/end select a line-aligned byte range.
+
+    The file is memory-mapped unless use_mmap is False. A mapped file that
+    shrinks while it is read (e.g. logrotate copytruncate) raises SIGBUS,
+    so files that are still being written need use_mmap=False (--live).
+    """
+    if not use_mmap:
+        yield from read_lines_stream(path, max_lines, start, end)
+        return
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if end is None:
+                end = len(mm)
+            idx = 0
+            pos = start
+            while pos < end:
+                # split ~1 MiB windows of the mapping, cut at a newline
+                nl = mm.find(b"\n", min(pos + (1 << 20), end), end)
+                stop = end if nl < 0 else nl
+                lines = mm[pos:stop].split(b"\n")
+                if stop == end and not lines[-1]:
+                    lines.pop()
+                pos = stop + 1
+                if max_lines and idx + len(lines) >= max_lines:
+                    # negative max_lines yields nothing, like the stream reader
+                    yield from lines[:max(max_lines - idx, 0)]
+                    return
+                idx += len(lines)
+                yield from lines
+
+def chunk_ranges(path: str, jobs: int):
+    """Split the file into up to `jobs` byte ranges aligned to line starts."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, jobs):
+            f.seek(size * i // jobs)
+            f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(path, start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+def decode_field(value: bytes) -> str:
+    return value.decode("utf-8", errors="replace")
+
+def merge_undecodable(counts: dict) -> dict:
+    # keys differing only in invalid UTF-8 decode to the same text, so merge
+    # them under that text; valid (e.g. all-ASCII) tallies are returned as-is
+    try:
+        for key in counts:
+            key.decode("utf-8")
+    except UnicodeDecodeError:
+        merged = {}
+        for key, cnt in counts.items():
+            key = decode_field(key).encode("utf-8")
+            merged[key] = merged.get(key, 0) + cnt
+        return merged
+    return counts
+
+def decode_sample(line: bytes) -> str:
+    # lines are split on b"\n" only; drop the CR of CRLF logs for the report
+    if line.endswith(b"\r"):
+        line = line[:-1]
+    return decode_field(line)
+
+def parse_log_line_fast(line: bytes):
+    """Split a combined-format line on its quote and whitespace delimiters.
+
+    Returns the same tuple as parse_log_line() or None when the line does not
+    have the plain shape; callers then fall back to LOG_PATTERN, which stays
+    the reference for what a valid line is.
+    """
+    # ip ident user [time] "request" status size "referer" "ua"
+    parts = line.split(b'"')
+    if len(parts) != 7:
+        return None
+    head, request, mid, referer, sep, ua, tail = parts
+    if not sep.isspace() or (tail and not tail.isspace()):
         return None
-    d = m.groupdict()
-    d["status"] = safe_int(d["status"], 0)
-    d["size"] = 0 if d["size"] == "-" else safe_int(d["size"], 0)
-    return d
 
-def make_html_report(title: str, summary: dict, top_ips, top_uas, status_counts, errors_sample):
-    def tr(cells):
-        return "<tr>" + "".join(f"<td>{html.escape(str(c))}</td>" for c in cells) + "</tr>"
+    # bytes.split() without a separator treats whitespace runs like \s+
+    if not head or head[:1].isspace():
+        return None
+    head = head.split(None, 3)
+    if len(head) != 4:
+        return None
+    ip, _ident, _user, time = head
+    stripped = time.rstrip()
+    if (
+        len(stripped) < 3 or stripped == time
+        or stripped[:1] != b"[" or stripped[-1:] != b"]" or b"]" in stripped[1:-1]
+    ):
+        return None
 
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    rows_ips = "\n".join(tr([ip, cnt]) for ip, cnt in top_ips) or tr(["-", 0])
-    rows_uas = "\n".join(tr([ua, cnt]) for ua, cnt in top_uas) or tr(["-", 0])
-    rows_status = "\n".join(tr([status, cnt]) for status, cnt in sorted(status_counts.items())) or tr(["-", 0])
+    if not request or request[:1].isspace():
+        return None
+    request = request.split(None, 2)
+    if len(request) != 3:
+        return None
 
-    errors_html = ""
-    if errors_sample:
-        items = "\n".join(f"<li><code>{html.escape(x)}</code></li>" for x in errors_sample[:20])
-        errors_html = f"<ul>{items}</ul>"
-    else:
-        errors_html = "<p>No malformed lines found.</p>"
+    if not mid[:1].isspace() or not mid[-1:].isspace():
+        return None
+    mid = mid.split()
+    if len(mid) != 2:
+        return None
+    status, size = mid
+    if len(status) != 3 or not status.isdigit():
+        return None
+
+    return (
+        ip,
+        stripped[1:-1],
+        request[0],
+        request[1],
+        request[2],
+        safe_int(status, 0),
+        0 if size == b"-" else safe_int(size, 0),
+        referer,
+        ua,
+    )
+
+_SPLIT = _parse_line_ext or parse_log_line_fast
 
-    return f"""<!doctype html>
+def parse_log_line(line: bytes):
+    """Return (ip, time, method, path, proto, status, size, referer, ua) or None."""
+    parsed = _SPLIT(line)
+    if parsed is not None:
+        return parsed
+
+    m = _MATCH(line)
+    if not m:
+        return None
+    ip, time, method, path, proto, status, size, referer, ua = m.groups()
+    return (
+        ip,
+        time,
+        method,
+        path,
+        proto,
+        safe_int(status, 0),
+        0 if size == b"-" else safe_int(size, 0),
+        referer,
+        ua,
+    )
+
+_HTML_TEMPLATE = string.Template("""<!doctype html>
 <html lang="en">
 <head>
   <meta charset="utf-8" />
   <meta name="viewport" content="width=device-width,initial-scale=1" />
-  <title>{html.escape(title)}</title>
+  <title>$title</title>
   <style>
-    body {{ font-family: Arial, sans-serif; margin: 24px; }}
-    .meta {{ color: #555; margin-bottom: 18px; }}
-    table {{ border-collapse: collapse; width: 100%; margin: 12px 0 24px 0; }}
-    th, td {{ border: 1px solid #ddd; padding: 8px; vertical-align: top; }}
-    th {{ background: #f3f3f3; text-align: left; }}
-    code {{ background: #f7f7f7; padding: 2px 4px; border-radius: 4px; }}
-    .grid {{ display: grid; grid-template-columns: 1fr; gap: 18px; }}
-    @media (min-width: 900px) {{
-      .grid {{ grid-template-columns: 1fr 1fr; }}
-    }}
+    body { font-family: Arial, sans-serif; margin: 24px; }
+    .meta { color: #555; margin-bottom: 18px; }
+    table { border-collapse: collapse; width: 100%; margin: 12px 0 24px 0; }
+    th, td { border: 1px solid #ddd; padding: 8px; vertical-align: top; }
+    th { background: #f3f3f3; text-align: left; }
+    code { background: #f7f7f7; padding: 2px 4px; border-radius: 4px; }
+    .grid { display: grid; grid-template-columns: 1fr; gap: 18px; }
+    @media (min-width: 900px) {
+      .grid { grid-template-columns: 1fr 1fr; }
+    }
   </style>
 </head>
 <body>
-  <h1>{html.escape(title)}</h1>
-  <div class="meta">Generated at: {html.escape(now)}</div>
+  <h1>$title</h1>
+  <div class="meta">Generated at: $now</div>
 
   <h2>Summary</h2>
   <table>
     <tr><th>Metric</th><th>Value</th></tr>
-    {tr(["Input file", summary.get("input_file","-")])}
-    {tr(["Total lines", summary.get("total_lines",0)])}
-    {tr(["Parsed lines", summary.get("parsed_lines",0)])}
-    {tr(["Malformed lines", summary.get("malformed_lines",0)])}
+    $rows_summary
   </table>
 
   <div class="grid">
@@ -101,7 +294,7 @@ def make_html_report(title: str, summary: dict, top_ips, top_uas, status_counts,
       <h2>Top IP addresses</h2>
       <table>
         <tr><th>IP</th><th>Count</th></tr>
-        {rows_ips}
+        $rows_ips
       </table>
     </div>
 
@@ -109,7 +302,7 @@ def make_html_report(title: str, summary: dict, top_ips, top_uas, status_counts,
       <h2>Top User-Agents</h2>
       <table>
         <tr><th>User-Agent</th><th>Count</th></tr>
-        {rows_uas}
+        $rows_uas
       </table>
     </div>
   </div>
@@ -117,49 +310,205 @@ def make_html_report(title: str, summary: dict, top_ips, top_uas, status_counts,
   <h2>HTTP status codes</h2>
   <table>
     <tr><th>Status</th><th>Count</th></tr>
-    {rows_status}
+    $rows_status
   </table>
 
   <h2>Malformed lines sample</h2>
-  {errors_html}
+  $errors_html
 
 </body>
 </html>
-"""
+""")
+_ROW = "<tr><td>{}</td><td>{}</td></tr>"
 
-def main() -> int:
-    args = parse_args()
+def make_html_report(title: str, summary: dict, top_ips, top_uas, status_counts, errors_sample):
+    esc = html.escape
+    row = _ROW.format
 
-    if not os.path.isfile(args.input):
-        print(f"ERROR: input file not found: {args.input}", file=sys.stderr)
-        return 1
+    def cell(value):
+        # status codes and counts are ints and never need escaping
+        return value if isinstance(value, int) else esc(str(value))
+
+    def rows_html(rows):
+        return "\n".join([row(cell(k), cell(v)) for k, v in rows]) or row("-", 0)
+
+    summary_rows = [
+        ("Input file", summary.get("input_file", "-")),
+        ("Total lines", summary.get("total_lines", 0)),
+        ("Parsed lines", summary.get("parsed_lines", 0)),
+        ("Malformed lines", summary.get("malformed_lines", 0)),
+    ]
+
+    if errors_sample:
+        items = "\n".join(["<li><code>" + esc(x) + "</code></li>" for x in errors_sample[:20]])
+        errors_html = f"<ul>{items}</ul>"
+    else:
+        errors_html = "<p>No malformed lines found.</p>"
+
+    return _HTML_TEMPLATE.substitute(
+        title=esc(title),
+        now=esc(datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        rows_summary="\n    ".join([row(cell(k), cell(v)) for k, v in summary_rows]),
+        rows_ips=rows_html(top_ips),
+        rows_uas=rows_html(top_uas),
+        rows_status=rows_html(sorted(status_counts.items())),
+        errors_html=errors_html,
+    )
 
-    ip_counts = collections.Counter()
-    ua_counts = collections.Counter()
-    status_counts = collections.Counter()
+def tally_lines(lines) -> dict:
+    # bytes keys; sys.intern() only takes str
+    ip_counts = collections.defaultdict(int)
+    ua_counts = collections.defaultdict(int)
+    status_counts = collections.defaultdict(int)
 
     total_lines = 0
     parsed_lines = 0
     malformed_lines = 0
     errors_sample = []
 
-    for line in read_lines(args.input, args.max_lines):
+    for line in lines:
         total_lines += 1
-        parsed = parse_log_line(line)
-        if not parsed:
+        # every valid line has a "]" and six quotes; skip the parsers otherwise
+        if b"]" in line and line.count(b'"') >= 6:
+            parsed = parse_log_line(line)
+        else:
+            parsed = None
+        if parsed is None:
             malformed_lines += 1
             if len(errors_sample) < 50:
-                errors_sample.append(line)
+                errors_sample.append(decode_sample(line))
             continue
 
         parsed_lines += 1
-        ip_counts[parsed["ip"]] += 1
-        ua_counts[parsed["ua"]] += 1
-        status_counts[parsed["status"]] += 1
+        ip_counts[parsed[0]] += 1
+        ua_counts[parsed[8]] += 1
+        status_counts[parsed[5]] += 1
+
+    return {
+        "ip_counts": ip_counts,
+        "ua_counts": ua_counts,
+        "status_counts": status_counts,
+        "total_lines": total_lines,
+        "parsed_lines": parsed_lines,
+        "malformed_lines": malformed_lines,
+        "errors_sample": errors_sample,
+    }
+
+def tally_buffer(buf, start: int, end: int) -> dict:
+    """Same result as tally_lines() for the lines of buf[start:end].
+
+    A single finditer() over the buffer replaces one match call per line;
+    lines between two matches are the malformed ones. start must be 0 or
+    just after a newline.
+    """
+    ip_counts = collections.defaultdict(int)
+    ua_counts = collections.defaultdict(int)
+    status_counts = collections.defaultdict(int)
+
+    parsed_lines = 0
+    malformed_lines = 0
+    errors_sample = []
+
+    def skip_gap(gap_start, gap_end):
+        # every line in the gap failed the pattern; the last one may lack b"\n"
+        nonlocal malformed_lines
+        gap = buf[gap_start:gap_end]
+        malformed_lines += gap.count(b"\n") + (not gap.endswith(b"\n"))
+        need = 50 - len(errors_sample)
+        if need > 0:
+            lines = gap.split(b"\n", need)
+            if len(lines) > need or not lines[-1]:
+                lines.pop()
+            errors_sample.extend(decode_sample(x) for x in lines)
+
+    pos = start
+    for m in _FINDITER(buf, start, end):
+        if m.start() != pos:
+            skip_gap(pos, m.start())
+        ip, _, _, _, _, status, _, _, ua = m.groups()
+        parsed_lines += 1
+        ip_counts[ip] += 1
+        ua_counts[ua] += 1
+        status_counts[safe_int(status, 0)] += 1
+        pos = m.end() + 1
+    if pos < end:
+        skip_gap(pos, end)
+
+    return {
+        "ip_counts": ip_counts,
+        "ua_counts": ua_counts,
+        "status_counts": status_counts,
+        "total_lines": parsed_lines + malformed_lines,
+        "parsed_lines": parsed_lines,
+        "malformed_lines": malformed_lines,
+        "errors_sample": errors_sample,
+    }
+
+def tally_file(path: str, max_lines: int = 0, start: int = 0, end: int = None, use_mmap: bool = True) -> dict:
+    if _FINDITER is None or max_lines or not use_mmap:
+        return tally_lines(read_lines(path, max_lines, start, end, use_mmap))
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return tally_lines(())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return tally_buffer(mm, start, len(mm) if end is None else end)
+
+def parse_chunk(task) -> dict:
+    path, start, end, use_mmap = task
+    return tally_file(path, 0, start, end, use_mmap)
+
+def merge_stats(results) -> dict:
+    """Combine per-chunk tallies; chunks must be given in file order."""
+    merged = {
+        "ip_counts": collections.Counter(),
+        "ua_counts": collections.Counter(),
+        "status_counts": collections.Counter(),
+        "total_lines": 0,
+        "parsed_lines": 0,
+        "malformed_lines": 0,
+        "errors_sample": [],
+    }
+    for stats in results:
+        for key in ("ip_counts", "ua_counts", "status_counts"):
+            merged[key].update(stats[key])
+        for key in ("total_lines", "parsed_lines", "malformed_lines"):
+            merged[key] += stats[key]
+        merged["errors_sample"].extend(stats["errors_sample"])
+    del merged["errors_sample"][50:]
+    return merged
+
+def main() -> int:
+    args = parse_args()
+
+    if not os.path.isfile(args.input):
+        print(f"ERROR: input file not found: {args.input}", file=sys.stderr)
+        return 1
+
+    if args.regex_engine == "re2" and LOG_PATTERN_RE2 is None:
+        print("ERROR: --regex-engine re2 requires the google-re2 package", file=sys.stderr)
+        return 1
+    use_regex_engine(args.regex_engine)
+
+    if args.jobs > 1 and not args.max_lines:
+        with multiprocessing.Pool(args.jobs, use_regex_engine, (args.regex_engine,)) as pool:
+            tasks = [(path, start, end, not args.live) for path, start, end in chunk_ranges(args.input, args.jobs)]
+            stats = merge_stats(pool.map(parse_chunk, tasks))
+    else:
+        stats = tally_file(args.input, args.max_lines, use_mmap=not args.live)
+
+    ip_counts = merge_undecodable(stats["ip_counts"])
+    ua_counts = merge_undecodable(stats["ua_counts"])
+    status_counts = stats["status_counts"]
+    total_lines = stats["total_lines"]
+    parsed_lines = stats["parsed_lines"]
+    malformed_lines = stats["malformed_lines"]
+    errors_sample = stats["errors_sample"]
 
     top_n = max(1, args.top)
-    top_ips = ip_counts.most_common(top_n)
-    top_uas = ua_counts.most_common(top_n)
+    # partial sort straight off the count dicts: O(U log n), no Counter copy
+    top_ips = [(decode_field(ip), cnt) for ip, cnt in nlargest(top_n, ip_counts.items(), key=itemgetter(1))]
+    top_uas = [(decode_field(ua), cnt) for ua, cnt in nlargest(top_n, ua_counts.items(), key=itemgetter(1))]
 
     summary = {
         "input_file": args.input,
@@ -0,0 +1,123 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Optional C tokenizer for log_parser.py.
+
+Build in place with:  cythonize -i log_parser_ext.pyx
+parse_line() mirrors log_parser.parse_log_line_fast() byte for byte: it returns
+the same tuple, or None for anything that is not in the plain shape so the
+caller can fall back to LOG_PATTERN.
+"""
+from libc.string cimport memchr
+
+
+cdef inline bint is_space(unsigned char c):
+    # same set as \s in a bytes regex: space, \t, \n, \v, \f, \r
+    return c == 32 or 9 <= c <= 13
+
+
+cdef inline Py_ssize_t skip_token(const unsigned char* buf, Py_ssize_t pos, Py_ssize_t end):
+    while pos < end and not is_space(buf[pos]):
+        pos += 1
+    return pos
+
+
+cdef inline Py_ssize_t skip_spaces(const unsigned char* buf, Py_ssize_t pos, Py_ssize_t end):
+    while pos < end and is_space(buf[pos]):
+        pos += 1
+    return pos
+
+
+cdef inline bint all_spaces(const unsigned char* buf, Py_ssize_t pos, Py_ssize_t end):
+    while pos < end:
+        if not is_space(buf[pos]):
+            return False
+        pos += 1
+    return True
+
+
+def parse_line(bytes line):
+    cdef const unsigned char* buf = line
+    cdef Py_ssize_t n = len(line)
+    cdef Py_ssize_t q[6]
+    cdef Py_ssize_t i, pos = 0
+    cdef const unsigned char* hit
+
+    # ip ident user [time] "request" status size "referer" "ua"
+    for i in range(6):
+        hit = <const unsigned char*>memchr(buf + pos, 34, n - pos)
+        if hit == NULL:
+            return None
+        q[i] = hit - buf
+        pos = q[i] + 1
+    if memchr(buf + pos, 34, n - pos) != NULL:
+        return None
+    if q[4] == q[3] + 1 or not all_spaces(buf, q[3] + 1, q[4]) or not all_spaces(buf, q[5] + 1, n):
+        return None
+
+    # head: ip ident user, then "[time]" followed by whitespace
+    cdef Py_ssize_t ip_end, tok, t0, t1
+    if q[0] == 0 or is_space(buf[0]):
+        return None
+    ip_end = skip_token(buf, 0, q[0])
+    pos = ip_end
+    for i in range(2):
+        tok = skip_spaces(buf, pos, q[0])
+        pos = skip_token(buf, tok, q[0])
+        if pos == tok:
+            return None
+    t0 = skip_spaces(buf, pos, q[0])
+    t1 = q[0]
+    while t1 > t0 and is_space(buf[t1 - 1]):
+        t1 -= 1
+    if t1 - t0 < 3 or t1 == q[0] or buf[t0] != 91 or buf[t1 - 1] != 93:
+        return None
+    if memchr(buf + t0 + 1, 93, t1 - t0 - 2) != NULL:
+        return None
+
+    # request: METHOD PATH PROTO
+    cdef Py_ssize_t m0 = q[0] + 1, m1, p0, p1, r0
+    if m0 == q[1] or is_space(buf[m0]):
+        return None
+    m1 = skip_token(buf, m0, q[1])
+    p0 = skip_spaces(buf, m1, q[1])
+    p1 = skip_token(buf, p0, q[1])
+    r0 = skip_spaces(buf, p1, q[1])
+    if p0 == p1 or r0 == q[1]:
+        return None
+
+    # status and size, each surrounded by whitespace
+    cdef Py_ssize_t s0, s1, z0, z1
+    if q[2] - q[1] < 2 or not is_space(buf[q[1] + 1]) or not is_space(buf[q[2] - 1]):
+        return None
+    s0 = skip_spaces(buf, q[1] + 1, q[2])
+    s1 = skip_token(buf, s0, q[2])
+    z0 = skip_spaces(buf, s1, q[2])
+    z1 = skip_token(buf, z0, q[2])
+    if z0 == z1 or skip_spaces(buf, z1, q[2]) != q[2]:
+        return None
+    if s1 - s0 != 3:
+        return None
+    for i in range(s0, s1):
+        if not 48 <= buf[i] <= 57:
+            return None
+    status = (buf[s0] - 48) * 100 + (buf[s0 + 1] - 48) * 10 + (buf[s0 + 2] - 48)
+
+    size = line[z0:z1]
+    if size == b"-":
+        size = 0
+    else:
+        try:
+            size = int(size)
+        except Exception:
+            size = 0
+
+    return (
+        line[:ip_end],
+        line[t0 + 1:t1 - 1],
+        line[m0:m1],
+        line[p0:p1],
+        line[r0:q[1]],
+        status,
+        size,
+        line[q[2] + 1:q[3]],
+        line[q[4] + 1:q[5]],
+    )